@@ -15,6 +15,7 @@ from .core import (
     Trailrunner,
     walk,
     walk_and_run,
+    walk_batched,
 )
 
 __all__ = [
@@ -27,4 +28,5 @@ __all__ = [
     "Trailrunner",
     "walk",
     "walk_and_run",
+    "walk_batched",
 ]
@@ -2,19 +2,40 @@
 # Licensed under the MIT license
 
 import multiprocessing
-from concurrent.futures import as_completed, Executor, ProcessPoolExecutor
+import os
+import re
+import stat
+import sys
+import time
+from concurrent.futures import (
+    Executor,
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 from typing import (
+    Any,
     Callable,
+    cast,
     Dict,
     Generator,
     Iterable,
     Iterator,
     List,
+    Literal,
     Optional,
+    overload,
+    Set,
     Tuple,
     Type,
     TypeVar,
+    Union,
 )
 
 from pathspec import PathSpec, Pattern, RegexPattern
@@ -23,6 +44,14 @@ from pathspec.patterns.gitwildmatch import GitWildMatchPattern
 
 T = TypeVar("T")
 Excludes = Optional[List[str]]
+WalkItem = Union[Path, Tuple[Path, os.stat_result]]
+IgnoreMatchers = Tuple[
+    Callable[[str], bool],
+    Callable[[str], Optional[bool]],
+    Callable[[str], Optional[bool]],
+]
+NestedIgnores = Tuple[Tuple[str, Callable[[str], Optional[bool]]], ...]
+ScanItem = Tuple[str, str, NestedIgnores]
 
 
 EXECUTOR = None  # deprecated, will be removed by 2.0
@@ -40,27 +69,87 @@ by :func:`gitignore` for finding and reading a :file:`.gitignore` file from the
 root of a given path or directory.
 """
 
+_VCS_DIRS = frozenset({".git", ".hg", ".svn", ".bzr"})
+"""
+Version control metadata directories, which are never walked regardless of gitignore.
+"""
+
+
+@lru_cache(maxsize=1024)
+def _resolve_absolute(path: str) -> Path:
+    """
+    Cached canonical form of an absolute path, resolving any symlinks.
+    """
+    return Path(path).resolve()
+
+
+def _resolve(path: Path) -> Path:
+    """
+    Canonical form of the given path, relative to the current working directory.
+
+    Resolving symlinks takes a separate system call for each component of the path,
+    so results are cached by absolute path for repeated lookups.
+    """
+    return _resolve_absolute(os.path.abspath(path))
+
 
-def project_root(path: Path) -> Path:
+def project_root(path: Path, *, base: Optional[Path] = None) -> Path:
     """
     Find the project root, looking upward from the given path.
 
     Looks through all parent paths until either the root is reached, or a directory
     is found that contains any of :attr:`ROOT_MARKERS`.
+
+    Relative paths are resolved from `base` if given, instead of the current working
+    directory.
     """
-    real_path = path.resolve()
+    if base is not None:
+        path = base / path
+    return _find_root(_search_start(path))
+
 
-    parents = list(real_path.parents)
-    if real_path.is_dir():
-        parents.insert(0, real_path)
+def _search_start(path: Path) -> Path:
+    """
+    Directory to start searching for a project root from: the path itself if it's a
+    directory, otherwise the directory containing it.
+    """
+    real_path = _resolve(path)
+    try:
+        is_dir = stat.S_ISDIR(os.stat(real_path).st_mode)
+    except OSError:
+        is_dir = False
+    return real_path if is_dir else real_path.parent
 
-    for parent in parents:
-        if any((parent / marker).exists() for marker in ROOT_MARKERS):
+
+def _find_root(start: Path) -> Path:
+    """
+    Find the project root, looking upward from the given resolved directory.
+    """
+    for parent in (start, *start.parents):
+        if _has_root_marker(parent):
             return parent
 
     return parent
 
 
+def _has_root_marker(directory: Path) -> bool:
+    """
+    Check if the given directory contains any of :attr:`ROOT_MARKERS`.
+
+    Lists the directory once rather than checking each marker individually, falling
+    back to checking each marker if the directory can't be listed.
+    """
+    try:
+        names = set(os.listdir(directory))
+    except OSError:
+        return any((directory / marker).exists() for marker in ROOT_MARKERS)
+
+    return any(
+        (directory / marker).exists() if len(marker.parts) > 1 else marker.name in names
+        for marker in ROOT_MARKERS
+    )
+
+
 def pathspec(
     patterns: Excludes, *, style: Type[Pattern] = GitWildMatchPattern
 ) -> PathSpec:
@@ -76,23 +165,354 @@ def pathspec(
     return PathSpec([])
 
 
+_INCLUDE_SUFFIXES: Dict[str, Tuple[str, ...]] = {
+    r".+\.pyi?$": (".py", ".pyi"),
+}
+
+
+@lru_cache(maxsize=None)
+def _include_matcher(pattern: str) -> Callable[[str], bool]:
+    """
+    Function matching paths against the given include regex, shared across walks.
+
+    Known patterns that only match a file extension are checked with a simple suffix
+    comparison, while any other pattern falls back to a compiled `PathSpec`.
+    """
+    if pattern in _INCLUDE_SUFFIXES:
+        suffixes = _INCLUDE_SUFFIXES[pattern]
+        return lambda path: path.endswith(suffixes)
+
+    return PathSpec([RegexPattern(pattern)]).match_file
+
+
+_GROUP_NAME = re.compile(r"\(\?P<\w+>")
+
+
+def _combine_patterns(
+    patterns: List[Pattern],
+) -> Optional[Tuple["re.Pattern[str]", Dict[str, bool]]]:
+    """
+    Fold the given patterns into a single regex alternation, if possible.
+
+    Alternatives are ordered from the last pattern to the first, so the alternative
+    that matches is the last matching pattern, which decides whether the path is
+    ignored or re-included, like git. Patterns are matched anywhere in the path, like
+    pathspec, so any pattern that isn't anchored is prefixed to skip ahead in the
+    path. Returns the regex, along with a mapping of each alternative's group name to
+    whether that pattern ignores paths, or None if the patterns can't be combined.
+
+    Only gitignore-style patterns are combined. Their translated regexes never use
+    inline flags or backreferences, and only use alternation inside groups, while
+    arbitrary regex patterns could break or change meaning inside an alternation.
+    """
+    if not all(isinstance(p, GitWildMatchPattern) for p in patterns):
+        return None
+
+    regexes: List[Any] = [getattr(p, "regex", None) for p in patterns]
+    if None in regexes or len({r.flags for r in regexes}) > 1:
+        return None
+
+    # each alternative gets a numbered group, recording whether that pattern
+    # includes or excludes the path. other named groups can't repeat between
+    # alternatives, and aren't needed to match, so they become non-capturing.
+    decisions: Dict[str, bool] = {}
+    alternatives: List[str] = []
+    for idx, (pattern, regex) in enumerate(reversed(list(zip(patterns, regexes)))):
+        name = f"p{idx}"
+        decisions[name] = bool(pattern.include)
+        source = _GROUP_NAME.sub("(?:", regex.pattern)
+        if not regex.pattern.startswith("^"):
+            # a lazy prefix makes match() search the path, and still tries every
+            # position for this alternative before moving on to the next one
+            source = f"(?s:.*?)(?:{source})"
+        alternatives.append(f"(?P<{name}>{source})")
+
+    try:
+        combined = re.compile("|".join(alternatives), regexes[0].flags)
+    except re.error:
+        return None
+
+    return combined, decisions
+
+
+def _ignore_matcher(spec: PathSpec) -> Callable[[str], bool]:
+    """
+    Function matching normalized relative paths against the given ignore spec.
+
+    Every pattern in the spec is folded into a single regex, so that each path is
+    matched with one regex call. Falls back to the spec itself for patterns that
+    can't be combined.
+    """
+    patterns = [p for p in spec.patterns if p.include is not None]
+    if not patterns:
+        return lambda path: False
+
+    result = _combine_patterns(patterns)
+    if result is None:
+        return spec.match_file
+
+    combined, decisions = result
+    if all(decisions.values()):
+        return lambda path: combined.match(path) is not None
+
+    def matches(path: str) -> bool:
+        match = combined.match(path)
+        return match is not None and decisions[str(match.lastgroup)]
+
+    return matches
+
+
+def _ignore_decider(spec: PathSpec) -> Callable[[str], Optional[bool]]:
+    """
+    Function deciding whether the given ignore spec ignores a normalized relative path.
+
+    Like :func:`_ignore_matcher`, but returns None when no pattern in the spec matches
+    the path at all, rather than False, so that specs can defer to each other.
+    """
+    patterns = [p for p in spec.patterns if p.include is not None]
+    if not patterns:
+        return lambda path: None
+
+    result = _combine_patterns(patterns)
+    if result is None:
+        ordered = patterns[::-1]
+
+        def decide_each(path: str) -> Optional[bool]:
+            for pattern in ordered:
+                if pattern.match_file(path) is not None:
+                    return bool(pattern.include)
+            return None
+
+        return decide_each
+
+    combined, decisions = result
+
+    def decide(path: str) -> Optional[bool]:
+        match = combined.match(path)
+        return None if match is None else decisions[str(match.lastgroup)]
+
+    return decide
+
+
+@lru_cache(maxsize=128)
+def _excludes_spec(patterns: Tuple[str, ...]) -> PathSpec:
+    """
+    Compiled `PathSpec` for a set of exclude patterns, shared across walks.
+    """
+    return pathspec(list(patterns))
+
+
+_GLOB_CHARS = frozenset("*?[\\")
+
+
+def _is_literal(pattern: str) -> bool:
+    """
+    Check if a gitignore-style pattern matches paths by name alone, without globs.
+    """
+    if not pattern.strip("/") or pattern.startswith("#"):
+        return False
+    return pattern == pattern.rstrip() and _GLOB_CHARS.isdisjoint(pattern)
+
+
+@lru_cache(maxsize=128)
+def _split_excludes(
+    patterns: Tuple[str, ...]
+) -> Tuple[Optional[Callable[[str], bool]], Tuple[str, ...]]:
+    """
+    Separate literal exclude patterns, with no wildcards, from the remaining globs.
+
+    Literal patterns are checked with set lookups and prefix comparisons instead of
+    regexes. Returns a function matching paths against the literal patterns, or None
+    if there are none, along with the remaining patterns for use in a `PathSpec`.
+    Negated patterns depend on the order of every pattern, so if any are present,
+    all patterns are left for the `PathSpec`.
+    """
+    if any(pattern.startswith("!") for pattern in patterns):
+        return None, patterns
+
+    exact: Set[str] = set()
+    prefixes: List[str] = []
+    names: Set[str] = set()
+    dir_names: Set[str] = set()
+    remaining: List[str] = []
+
+    for pattern in patterns:
+        if not _is_literal(pattern):
+            remaining.append(pattern)
+            continue
+
+        dir_only = pattern.endswith("/")
+        name = pattern.strip("/")
+        if "/" in pattern.rstrip("/"):
+            # anchored to the project root, matching the path and anything under it
+            prefixes.append(name + "/")
+            if not dir_only:
+                exact.add(name)
+        elif dir_only:
+            dir_names.add(name)
+        else:
+            names.add(name)
+
+    if not (exact or prefixes or names or dir_names):
+        return None, patterns
+
+    prefix_tuple = tuple(prefixes)
+
+    def matches(path: str) -> bool:
+        if path in exact or path.startswith(prefix_tuple):
+            return True
+        # directory paths end with a slash, so the last part is only ever a file
+        parts = path.split("/")
+        return not names.isdisjoint(parts) or not dir_names.isdisjoint(parts[:-1])
+
+    return matches, tuple(remaining)
+
+
+def _exclude_matcher(ignore: PathSpec, excludes: Excludes) -> Callable[[str], bool]:
+    """
+    Function matching normalized relative paths against a gitignore and excludes.
+    """
+    literal, patterns = _split_excludes(tuple(excludes or ()))
+    matches = _ignore_matcher(ignore + _excludes_spec(patterns))
+    if literal is None:
+        return matches
+
+    return lambda path: literal(path) or matches(path)
+
+
+def _walk_matchers(ignore: PathSpec, excludes: Excludes) -> IgnoreMatchers:
+    """
+    Functions matching normalized relative paths while walking a project.
+
+    Returns a single matcher for both the gitignore and excludes, used wherever
+    there are no nested gitignore files, along with separate functions deciding
+    whether the gitignore or the excludes alone ignore a path, so that nested
+    gitignore files can be checked in between them.
+    """
+    literal, patterns = _split_excludes(tuple(excludes or ()))
+    remaining = _ignore_decider(_excludes_spec(patterns))
+
+    def exclude_decision(path: str) -> Optional[bool]:
+        if literal is not None and literal(path):
+            return True
+        return remaining(path)
+
+    return _exclude_matcher(ignore, excludes), _ignore_decider(ignore), exclude_decision
+
+
+_GITIGNORE_CACHE: Dict[str, Tuple[int, int, PathSpec]] = {}
+_GITIGNORE_SETTLE_NS = 2_000_000_000
+
+
 def gitignore(path: Path) -> PathSpec:
     """
     Generate a `PathSpec` object for a .gitignore file in the given directory.
 
     If none is found, an empty PathSpec is returned. If the path is not a directory,
     `ValueError` is raised.
+
+    Parsed files are cached by path, and reused until the file's modification time
+    or size changes, so repeated walks of the same project don't read it again.
     """
     if not path.is_dir():
         raise ValueError(f"path {path} not a directory")
 
     gi_path = path / ".gitignore"
+    try:
+        st = os.stat(gi_path)
+    except OSError:
+        return pathspec(None)
+
+    if not stat.S_ISREG(st.st_mode):
+        return pathspec(None)
+
+    # relative walks pass relative directories, which could point anywhere later
+    key = os.path.abspath(gi_path)
+    cached = _GITIGNORE_CACHE.get(key)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    # skip blank lines and comments before decoding, so they never reach pathspec
+    lines = [
+        line.decode("utf-8", "surrogateescape")
+        for line in gi_path.read_bytes().splitlines()
+        if line and not line.startswith(b"#")
+    ]
+    spec = pathspec(lines, style=GitWildMatchPattern)
+
+    # like git's racy index entries, a file modified this recently could change
+    # again without its timestamp moving, so it isn't cached until it settles
+    if time.time_ns() - st.st_mtime_ns > _GITIGNORE_SETTLE_NS:
+        _GITIGNORE_CACHE[key] = (st.st_mtime_ns, st.st_size, spec)
+
+    return spec
 
-    lines: Excludes = None
-    if gi_path.is_file():
-        lines = gi_path.read_text().splitlines()
 
-    return pathspec(lines, style=GitWildMatchPattern)
+def _entry_is_dir(entry: "os.DirEntry[str]") -> bool:
+    """
+    Check if a directory entry is a real directory, without following symlinks.
+
+    Uses the file type reported when listing the directory, only falling back to
+    a stat call on filesystems that don't report it. Entries that can't be checked,
+    like those with denied permissions, are treated as not being directories.
+    """
+    try:
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def _entry_is_file(entry: "os.DirEntry[str]") -> bool:
+    """
+    Check if a directory entry is a file, or a symlink to a file.
+
+    Only needs a stat call for symlinks, or on filesystems that don't report file
+    types when listing directories. Entries that can't be checked are skipped.
+    """
+    try:
+        return entry.is_file()
+    except OSError:
+        return False
+
+
+def _entry_stat(entry: "os.DirEntry[str]") -> Optional[os.stat_result]:
+    """
+    Stat result for a directory entry, or None if it can't be read.
+    """
+    try:
+        return entry.stat()
+    except OSError:
+        return None
+
+
+def _file_size(path: Path) -> int:
+    """
+    Size of the given file in bytes, or zero if it can't be read.
+    """
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def _flatten(batches: Generator[List[T], None, None]) -> Generator[T, None, None]:
+    """
+    Yield each item from a generator of batches, closing it if closed early.
+    """
+    try:
+        yield from chain.from_iterable(batches)
+    finally:
+        batches.close()
+
+
+def _apply_many(func: Callable[[Path], T], paths: List[Path]) -> List[T]:
+    """
+    Run the given function on a batch of paths within a single executor job.
+
+    Only the results are returned, in the same order as the given paths, so that the
+    paths themselves don't need to be pickled again on the way back from workers.
+    """
+    return [func(path) for path in paths]
 
 
 class Trailrunner:
@@ -102,10 +522,12 @@ class Trailrunner:
     The basic API functions above are lightweight wrappers calling their respective
     methods on fresh instances of the :class:`Trailrunner` class with no arguments.
 
-    By default, uses a process pool executor with "spawn" child processes, to enforce
-    consistent behavior when running functions on Linux, macOS, and Windows. This can
-    be overridden for each individual instance by passing an executor factory during
-    initialization.
+    By default, uses a process pool executor with "forkserver" child processes on
+    Linux and macOS, or "spawn" child processes on Windows. Neither share any state
+    with the parent process, to enforce consistent behavior when running functions
+    on all platforms, but the forkserver avoids starting a fresh interpreter for
+    every child process. This can be overridden for each individual instance by
+    passing an executor factory during initialization.
     """
 
     DEFAULT_EXECUTOR: Optional[Callable[[], Executor]] = None
@@ -118,6 +540,24 @@ class Trailrunner:
     behavior with other packages that also use trailrunner.
     """
 
+    INLINE_THRESHOLD: int = 0
+    """
+    Maximum number of paths that :meth:`Trailrunner.run` and
+    :meth:`Trailrunner.run_iter` will process by calling the function directly in the
+    current process, skipping the executor entirely.
+    Disabled by default, because inline functions share state with the caller.
+
+    Useful for tools where most invocations only touch a handful of files, and the
+    cost of starting a process pool would dwarf the actual work being done.
+    """
+
+    WALK_CHUNKSIZE: int = 16
+    """
+    Number of paths that :meth:`Trailrunner.walk_and_run` gathers into each executor
+    job by default. The total number of paths isn't known until the walk finishes,
+    so this is a fixed size rather than one based on the number of workers.
+    """
+
     EXCLUDED: Dict[Path, str] = {}
 
     def __init__(
@@ -126,6 +566,8 @@ class Trailrunner:
         concurrency: int = 0,
         context: Optional[multiprocessing.context.BaseContext] = None,
         executor_factory: Optional[Callable[[], Executor]] = None,
+        walk_concurrency: int = 1,
+        ignore: Optional[PathSpec] = None,
     ):
         """
         :param concurreny: maximum number of child processes to use for jobs.
@@ -138,12 +580,63 @@ class Trailrunner:
         :param executor_factory: Alternative executor factory. Must be a function that
             takes no arguments, and returns an instance
             of :class:`concurrent.futures.Executor`.
+        :param walk_concurrency: number of threads used to read directories when
+            walking paths. The default of ``1`` walks directories serially in the
+            calling thread. Values ``< 1`` will use the default concurrency level
+            from :mod:`concurrent.futures.ThreadPoolExecutor`.
+        :param ignore: Precomputed gitignore spec to use instead of reading the
+            :file:`.gitignore` file from the project root on every walk. Useful when
+            walking many paths within the same project, for example by passing
+            ``gitignore(project_root(path))``. Any `excludes` passed to walk are still
+            applied on top of this spec.
         """
         self.concurrency = concurrency
-        self.context = context or multiprocessing.get_context("spawn")
+        self.walk_concurrency = walk_concurrency
+        self.ignore = ignore
+        self.context = context or multiprocessing.get_context(
+            "spawn" if sys.platform == "win32" else "forkserver"
+        )
         self.executor_factory = (
             executor_factory or self.DEFAULT_EXECUTOR or self._default_executor
         )
+        self._persistent = False
+        self._executor: Optional[Executor] = None
+
+    def __enter__(self) -> "Trailrunner":
+        """
+        Keep a single executor alive for all jobs until the context exits.
+
+        Useful for tools that call :meth:`run` repeatedly, like watch modes, to avoid
+        paying the cost of starting new child processes for every call.
+        """
+        self._persistent = True
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shut down any executor kept alive by using this instance as a context manager.
+        """
+        self._persistent = False
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @contextmanager
+    def _get_executor(self) -> Iterator[Executor]:
+        """
+        Executor for a single job, reusing a persistent executor when possible.
+        """
+        if not self._persistent:
+            with self.executor_factory() as exe:
+                yield exe
+            return
+
+        if self._executor is None:
+            self._executor = self.executor_factory()
+        yield self._executor
 
     def _default_executor(self) -> Executor:
         """
@@ -154,56 +647,351 @@ class Trailrunner:
         concurrency = self.concurrency if self.concurrency > 0 else None
         return ProcessPoolExecutor(concurrency, mp_context=self.context)
 
-    def walk(self, path: Path, *, excludes: Excludes = None) -> Iterator[Path]:
+    def _workers(self) -> int:
+        """
+        Expected number of workers in the executor.
+        """
+        return self.concurrency if self.concurrency > 0 else os.cpu_count() or 1
+
+    def _chunksize(self, count: int) -> int:
+        """
+        Pick a batch size that gives each worker about four batches of paths.
+        """
+        return max(1, count // (4 * self._workers()))
+
+    @overload
+    def walk(
+        self,
+        path: Path,
+        *,
+        excludes: Excludes = None,
+        with_stat: Literal[False] = False,
+        base: Optional[Path] = None,
+    ) -> Generator[Path, None, None]: ...
+
+    @overload
+    def walk(
+        self,
+        path: Path,
+        *,
+        excludes: Excludes = None,
+        with_stat: Literal[True],
+        base: Optional[Path] = None,
+    ) -> Generator[Tuple[Path, os.stat_result], None, None]: ...
+
+    def walk(
+        self,
+        path: Path,
+        *,
+        excludes: Excludes = None,
+        with_stat: bool = False,
+        base: Optional[Path] = None,
+    ) -> Generator[WalkItem, None, None]:
         """
         Generate all significant file paths, starting from the given path.
 
         Finds the project root and any associated gitignore. Filters any paths that match
         a gitignore pattern. Recurses into subdirectories, and otherwise only includes
         files that match the :attr:`trailrunner.core.INCLUDE_PATTERN` regex.
+        Directories that match a gitignore pattern are skipped without being read, as
+        are version control directories like :file:`.git`, and symlinks to directories
+        are not followed.
+
+        Any :file:`.gitignore` files found in subdirectories also apply to the paths
+        below them, unless the runner was given a precomputed `ignore` spec. Like git,
+        patterns in deeper files take priority, so they can re-include paths ignored
+        by files above them, while `excludes` take priority over every gitignore.
 
         Optional `excludes` parameter allows supplying an extra set of paths (or
         gitignore-style patterns) to exclude from the final results.
 
+        If `with_stat` is true, yields tuples of each path and its stat result instead,
+        reusing the file attributes already fetched while listing directories where
+        the platform provides them, like on Windows.
+
+        If `base` is given, a relative path is walked from `base` instead of the current
+        working directory, and yielded paths are relative to `base`.
+
         Returns a generator that yields each significant file as the tree is walked.
+        Files in each directory are yielded in sorted order by name, before walking
+        its subdirectories in sorted order, unless `walk_concurrency` is enabled.
         """
-        root = project_root(path)
-        ignore = gitignore(root) + pathspec(excludes)
-        include = PathSpec([RegexPattern(INCLUDE_PATTERN)])
+        root = project_root(path, base=base)
+        matchers = _walk_matchers(self._gitignore(root), excludes)
+        return _flatten(
+            self._walk_batched(path, root, matchers, with_stat=with_stat, base=base)
+        )
+
+    @overload
+    def walk_batched(
+        self,
+        path: Path,
+        *,
+        excludes: Excludes = None,
+        with_stat: Literal[False] = False,
+        base: Optional[Path] = None,
+    ) -> Iterator[List[Path]]: ...
 
-        def gen(children: Iterable[Path], *, explicit: bool = False) -> Iterator[Path]:
-            for child in children:
-                relative = child.resolve().relative_to(root)
-                if ignore.match_file(relative):
-                    self.EXCLUDED[child] = "matched gitignore"
-                    continue
+    @overload
+    def walk_batched(
+        self,
+        path: Path,
+        *,
+        excludes: Excludes = None,
+        with_stat: Literal[True],
+        base: Optional[Path] = None,
+    ) -> Iterator[List[Tuple[Path, os.stat_result]]]: ...
+
+    def walk_batched(
+        self,
+        path: Path,
+        *,
+        excludes: Excludes = None,
+        with_stat: bool = False,
+        base: Optional[Path] = None,
+    ) -> Iterator[List[Any]]:
+        """
+        Generate lists of significant file paths, starting from the given path.
 
-                if child.is_file() and (explicit or include.match_file(child)):
-                    yield child
+        Works the same as :meth:`Trailrunner.walk`, but yields a list of the files
+        found in each directory, rather than each file individually, saving a
+        generator step per file when consuming large trees. Directories without any
+        significant files don't yield empty lists.
+        """
+        root = project_root(path, base=base)
+        matchers = _walk_matchers(self._gitignore(root), excludes)
+        return self._walk_batched(path, root, matchers, with_stat=with_stat, base=base)
 
-                elif child.is_dir():
-                    yield from gen(child.iterdir())
+    def _gitignore(self, root: Path) -> PathSpec:
+        """
+        Gitignore spec for the given project root, unless one was given at init.
+        """
+        if self.ignore is not None:
+            return self.ignore
+        return gitignore(root)
 
-        return gen([path], explicit=True)
+    def _walk_batched(
+        self,
+        path: Path,
+        root: Path,
+        matchers: IgnoreMatchers,
+        *,
+        with_stat: bool = False,
+        base: Optional[Path] = None,
+    ) -> Generator[List[WalkItem], None, None]:
+        """
+        Walk the given path, using an already computed project root and ignore matcher,
+        yielding the list of files found in each directory.
 
-    def run(self, paths: Iterable[Path], func: Callable[[Path], T]) -> Dict[Path, T]:
+        The matchers are compiled once by the caller from the gitignore and excludes,
+        and shared by every directory in the walk. Unless a precomputed ignore spec
+        was given, any :file:`.gitignore` files in subdirectories are read as the walk
+        reaches them, and apply to everything below that directory.
+        """
+        include = _include_matcher(INCLUDE_PATTERN)
+        matches, gitignore_decision, exclude_decision = matchers
+
+        # relative paths walked from an explicit base are scanned through the joined
+        # path, and have the base sliced back off of every path found
+        top = os.fspath(path)
+        cut = 0
+        if base is not None and not path.is_absolute():
+            top = os.path.join(base, path)
+            cut = len(os.path.join(base, ""))
+
+        def load(dirpath: str, reldir: str, nested: NestedIgnores) -> NestedIgnores:
+            # the root gitignore is already part of the shared matcher, and a
+            # precomputed spec replaces reading any gitignore files at all
+            if not reldir or self.ignore is not None:
+                return nested
+            spec = gitignore(Path(dirpath))
+            if not spec.patterns:
+                return nested
+            return (*nested, (reldir, _ignore_decider(spec)))
+
+        def decide(relative: str, nested: NestedIgnores) -> bool:
+            # like git, excludes take priority over every gitignore file, and each
+            # gitignore file takes priority over the ones in directories above it
+            decision = exclude_decision(relative)
+            for reldir, nested_decide in reversed(nested):
+                if decision is not None:
+                    break
+                decision = nested_decide(relative[len(reldir) :])
+            if decision is None:
+                decision = gitignore_decision(relative)
+            return bool(decision)
+
+        # paths stay as plain strings while walking, and only get turned into Path
+        # objects once they are known to be included or excluded
+        def ignored(
+            child: str, relative: str, nested: NestedIgnores, *, is_dir: bool = False
+        ) -> bool:
+            if is_dir and relative:
+                # match directories with a trailing slash, like git, so that
+                # dir-only patterns exclude the whole subtree before descending
+                relative += "/"
+            if decide(relative, nested) if nested else matches(relative):
+                self.EXCLUDED[Path(child[cut:])] = "matched gitignore"
+                return True
+            return False
+
+        def scan(
+            dirpath: str, reldir: str, nested: NestedIgnores
+        ) -> Tuple[List[WalkItem], List[ScanItem]]:
+            # sorting each directory is cheap, and gives a stable order that
+            # doesn't depend on the filesystem
+            with os.scandir(dirpath) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+
+            # nested gitignore files are only read once the walk reaches them, so
+            # any in directories that are already ignored are never opened
+            if any(entry.name == ".gitignore" for entry in entries):
+                nested = load(dirpath, reldir, nested)
+
+            files: List[WalkItem] = []
+            dirs: List[ScanItem] = []
+            for entry in entries:
+                # relative paths are built up while descending from the root,
+                # rather than resolving each entry back to the project root
+                relative = reldir + entry.name
+
+                # DirEntry.is_file/is_dir reuse the file type from readdir, so each
+                # entry costs no extra stat calls unless it is a symlink.
+                # test the single include regex before the full set of ignore
+                # patterns, so that most files only need one match to reject.
+                # symlinked directories aren't followed, matching git, which also
+                # avoids walking the same tree twice or looping forever.
+                if _entry_is_dir(entry):
+                    if entry.name in _VCS_DIRS:
+                        excluded = Path(entry.path[cut:])
+                        self.EXCLUDED[excluded] = "version control directory"
+                    elif not ignored(entry.path, relative, nested, is_dir=True):
+                        dirs.append((entry.path, relative + "/", nested))
+
+                elif _entry_is_file(entry) and include(entry.path):
+                    if not ignored(entry.path, relative, nested):
+                        child = Path(entry.path[cut:])
+                        if not with_stat:
+                            files.append(child)
+                        else:
+                            stat = _entry_stat(entry)
+                            if stat is not None:
+                                files.append((child, stat))
+
+            return files, dirs
+
+        def gen(item: ScanItem) -> Iterator[List[WalkItem]]:
+            # walk depth-first with an explicit stack, rather than recursing through
+            # nested generators for every level of subdirectories
+            stack = [item]
+            while stack:
+                files, dirs = scan(*stack.pop())
+                if files:
+                    yield files
+                stack.extend(reversed(dirs))
+
+        def gen_threaded(item: ScanItem) -> Iterator[List[WalkItem]]:
+            # directories are scanned and filtered in worker threads, and any
+            # subdirectories found are queued back to the pool as they finish
+            workers = self.walk_concurrency if self.walk_concurrency > 0 else None
+            with ThreadPoolExecutor(workers) as exe:
+                pending: Set[Future[Tuple[List[WalkItem], List[ScanItem]]]] = {
+                    exe.submit(scan, *item)
+                }
+                try:
+                    while pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            files, dirs = future.result()
+                            pending.update(exe.submit(scan, *d) for d in dirs)
+                            if files:
+                                yield files
+                finally:
+                    for future in pending:
+                        future.cancel()
+
+        def start() -> Generator[List[WalkItem], None, None]:
+            # a single stat decides between walking a directory and yielding a file,
+            # and is reused as the stat result for an explicit file
+            try:
+                st = os.stat(top)
+            except OSError:
+                return
+
+            target = Path(top)
+            relative = Path(os.path.relpath(_resolve(target), root)).as_posix()
+            relative = "" if relative == "." else relative
+
+            # gitignore files in directories above the starting path still apply,
+            # even though the walk itself won't reach them
+            nested: NestedIgnores = ()
+            parts = relative.split("/")[:-1]
+            for idx in range(1, len(parts) + 1):
+                reldir = "/".join(parts[:idx]) + "/"
+                nested = load(os.path.join(root, reldir), reldir, nested)
+
+            is_dir = stat.S_ISDIR(st.st_mode)
+            if ignored(top, relative, nested, is_dir=is_dir):
+                return
+
+            if is_dir:
+                item = (top, relative + "/" if relative else "", nested)
+                if self.walk_concurrency == 1:
+                    yield from gen(item)
+                else:
+                    yield from gen_threaded(item)
+
+            elif stat.S_ISREG(st.st_mode):
+                yield [(path, st) if with_stat else path]
+
+        return start()
+
+    def run(
+        self,
+        paths: Iterable[Path],
+        func: Callable[[Path], T],
+        *,
+        chunksize: Optional[int] = None,
+        largest_first: bool = False,
+    ) -> Dict[Path, T]:
         """
         Run a given function once for each path, using an executor for concurrency.
 
         For each path given, `func` will be called with `path` as the only argument.
         To pass any other positional or keyword arguments, use `functools.partial`.
+        Duplicate paths are only run once.
+
+        Paths are sent to process pool executors in batches of `chunksize` paths,
+        to reduce the overhead of sending each path to child processes. By default,
+        picks a size that gives each worker about four batches.
+
+        If `largest_first` is true, paths are run in order of decreasing file size,
+        so that the slowest files don't end up as stragglers at the end of the run.
 
         Results from each path will be returned as a dictionary mapping path to result.
         """
-        paths = list(paths)
+        paths = list(dict.fromkeys(paths))
 
-        with self.executor_factory() as exe:
-            results = list(exe.map(func, paths))
+        if largest_first:
+            with ThreadPoolExecutor() as pool:
+                sizes = dict(zip(paths, pool.map(_file_size, paths)))
+            paths.sort(key=sizes.__getitem__, reverse=True)
+
+        if len(paths) <= self.INLINE_THRESHOLD:
+            return {path: func(path) for path in paths}
+
+        chunksize = chunksize or self._chunksize(len(paths))
+        with self._get_executor() as exe:
+            results = list(exe.map(func, paths, chunksize=chunksize))
 
         return dict(zip(paths, results))
 
     def run_iter(
-        self, paths: Iterable[Path], func: Callable[[Path], T]
+        self,
+        paths: Iterable[Path],
+        func: Callable[[Path], T],
+        *,
+        chunksize: Optional[int] = None,
     ) -> Generator[Tuple[Path, T], None, None]:
         """
         Run a given function once for each path, using an executor for concurrency.
@@ -211,14 +999,49 @@ class Trailrunner:
         For each path given, `func` will be called with `path` as the only argument.
         To pass any other positional or keyword arguments, use `functools.partial`.
 
-        Each path, and the function result, will be yielded as they are completed.
+        Paths are submitted to the executor in batches of `chunksize` paths, to reduce
+        the overhead of sending each path to child processes. By default, picks a size
+        that gives each worker about four batches.
+
+        Each path, and the function result, will be yielded as their batch completes.
+        Only about two batches per worker are queued in the executor at any time, with
+        more submitted as results are consumed, so unread results don't pile up.
         """
-        with self.executor_factory() as exe:
-            futures = {exe.submit(func, path): path for path in paths}
-            for future in as_completed(futures):
-                path = futures[future]
-                value = future.result()
-                yield path, value
+        paths = list(paths)
+        if len(paths) <= self.INLINE_THRESHOLD:
+            for path in paths:
+                yield path, func(path)
+            return
+
+        chunksize = chunksize or self._chunksize(len(paths))
+
+        chunks = (
+            paths[idx : idx + chunksize] for idx in range(0, len(paths), chunksize)
+        )
+
+        with self._get_executor() as exe:
+            pending: Dict[Future[List[T]], List[Path]] = {}
+
+            def submit() -> None:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending[exe.submit(_apply_many, func, chunk)] = chunk
+
+            for _ in range(2 * self._workers()):
+                submit()
+
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        # refill the window before yielding, so workers stay busy
+                        # while the caller handles results
+                        chunk = pending.pop(future)
+                        submit()
+                        yield from zip(chunk, future.result())
+            finally:
+                for future in pending:
+                    future.cancel()
 
     def walk_and_run(
         self,
@@ -226,37 +1049,178 @@ class Trailrunner:
         func: Callable[[Path], T],
         *,
         excludes: Excludes = None,
+        chunksize: Optional[int] = None,
     ) -> Dict[Path, T]:
         """
         Walks each path given, and runs the given function on all gathered paths.
 
         See :meth:`Trailrunner.walk` for details on how paths are gathered, and
         :meth:`Trailrunner.run` for how functions are run for each gathered path.
-        """
-        all_paths: List[Path] = []
-        for path in paths:
-            all_paths.extend(self.walk(path, excludes=excludes))
 
-        return self.run(all_paths, func)
+        Paths are submitted to the executor in batches of `chunksize` paths as they
+        are found, defaulting to :attr:`WALK_CHUNKSIZE`, and each unique path is only
+        run once, even if reached from multiple given paths.
+        """
+        chunksize = chunksize or self.WALK_CHUNKSIZE
+
+        # submit each batch as soon as it's full, so that the executor can start
+        # running jobs while the rest of the tree is still being walked
+        futures: Dict[Future[List[T]], List[Path]] = {}
+        seen: Set[Path] = set()
+        batch: List[Path] = []
+
+        # many paths often share a project root, so only read each gitignore once
+        matchers: Dict[Path, IgnoreMatchers] = {}
+
+        # paths in the same directory always share a project root, so only search
+        # upward from each distinct directory once
+        roots: Dict[Path, Path] = {}
+
+        with self._get_executor() as exe:
+            for path in paths:
+                start = _search_start(path)
+                if start not in roots:
+                    roots[start] = _find_root(start)
+                root = roots[start]
+                if root not in matchers:
+                    ignore = self._gitignore(root)
+                    matchers[root] = _walk_matchers(ignore, excludes)
+
+                for files in cast(
+                    Iterator[List[Path]],
+                    self._walk_batched(path, root, matchers[root]),
+                ):
+                    for child in files:
+                        if child not in seen:
+                            seen.add(child)
+                            batch.append(child)
+                            if len(batch) >= chunksize:
+                                futures[exe.submit(_apply_many, func, batch)] = batch
+                                batch = []
+
+            if batch:
+                futures[exe.submit(_apply_many, func, batch)] = batch
+
+            return {
+                child: result
+                for future, chunk in futures.items()
+                for child, result in zip(chunk, future.result())
+            }
 
 
 # Maintain basic API with a default TrailRunner instance
 
 
-def walk(path: Path, *, excludes: Excludes = None) -> Iterator[Path]:
+@overload
+def walk(
+    path: Path,
+    *,
+    excludes: Excludes = None,
+    with_stat: Literal[False] = False,
+    ignore: Optional[PathSpec] = None,
+    base: Optional[Path] = None,
+) -> Generator[Path, None, None]: ...
+
+
+@overload
+def walk(
+    path: Path,
+    *,
+    excludes: Excludes = None,
+    with_stat: Literal[True],
+    ignore: Optional[PathSpec] = None,
+    base: Optional[Path] = None,
+) -> Generator[Tuple[Path, os.stat_result], None, None]: ...
+
+
+def walk(
+    path: Path,
+    *,
+    excludes: Excludes = None,
+    with_stat: bool = False,
+    ignore: Optional[PathSpec] = None,
+    base: Optional[Path] = None,
+) -> Generator[WalkItem, None, None]:
     """
     Generate all significant file paths, starting from the given path.
 
     Finds the project root and any associated gitignore. Filters any paths that match
     a gitignore pattern. Recurses into subdirectories, and otherwise only includes
     files that match the :attr:`trailrunner.core.INCLUDE_PATTERN` regex.
+    Directories that match a gitignore pattern are skipped without being read, as are
+    version control directories like :file:`.git`, and symlinks to directories are
+    not followed.
+
+    Any :file:`.gitignore` files found in subdirectories also apply to the paths below
+    them, unless a precomputed `ignore` spec is given. Like git, patterns in deeper
+    files take priority, so they can re-include paths ignored by files above them,
+    while `excludes` take priority over every gitignore.
 
     Optional `excludes` parameter allows supplying an extra set of paths (or
     gitignore-style patterns) to exclude from the final results.
 
+    If `with_stat` is true, yields tuples of each path and its stat result instead,
+    reusing the file attributes already fetched while listing directories where
+    the platform provides them, like on Windows.
+
+    Optional `ignore` parameter allows supplying a precomputed gitignore spec, to
+    avoid reading and compiling the project's :file:`.gitignore` for every walk.
+
+    If `base` is given, a relative path is walked from `base` instead of the current
+    working directory, and yielded paths are relative to `base`.
+
     Returns a generator that yields each significant file as the tree is walked.
+    Files in each directory are yielded in sorted order by name, before walking its
+    subdirectories in sorted order.
+    """
+    runner = Trailrunner(ignore=ignore)
+    if with_stat:
+        return runner.walk(path, excludes=excludes, with_stat=True, base=base)
+    return runner.walk(path, excludes=excludes, base=base)
+
+
+@overload
+def walk_batched(
+    path: Path,
+    *,
+    excludes: Excludes = None,
+    with_stat: Literal[False] = False,
+    ignore: Optional[PathSpec] = None,
+    base: Optional[Path] = None,
+) -> Iterator[List[Path]]: ...
+
+
+@overload
+def walk_batched(
+    path: Path,
+    *,
+    excludes: Excludes = None,
+    with_stat: Literal[True],
+    ignore: Optional[PathSpec] = None,
+    base: Optional[Path] = None,
+) -> Iterator[List[Tuple[Path, os.stat_result]]]: ...
+
+
+def walk_batched(
+    path: Path,
+    *,
+    excludes: Excludes = None,
+    with_stat: bool = False,
+    ignore: Optional[PathSpec] = None,
+    base: Optional[Path] = None,
+) -> Iterator[List[Any]]:
+    """
+    Generate lists of significant file paths, starting from the given path.
+
+    Works the same as :func:`walk`, but yields a list of the files found in each
+    directory, rather than each file individually, saving a generator step per file
+    when consuming large trees. Directories without any significant files don't
+    yield empty lists.
     """
-    return Trailrunner().walk(path, excludes=excludes)
+    runner = Trailrunner(ignore=ignore)
+    if with_stat:
+        return runner.walk_batched(path, excludes=excludes, with_stat=True, base=base)
+    return runner.walk_batched(path, excludes=excludes, base=base)
 
 
 def run(paths: Iterable[Path], func: Callable[[Path], T]) -> Dict[Path, T]:
@@ -268,9 +1232,9 @@ def run(paths: Iterable[Path], func: Callable[[Path], T]) -> Dict[Path, T]:
 
     Results from each path will be returned as a dictionary mapping path to result.
 
-    Uses a process pool with "spawned" processes that share no state with the parent
-    process, to enforce consistent behavior on Linux, macOS, and Windows, where forked
-    processes are not possible.
+    Uses a process pool with "forkserver" or "spawned" processes that share no state
+    with the parent process, to enforce consistent behavior on Linux, macOS, and
+    Windows, where forked processes are not possible.
     """
     return Trailrunner().run(paths, func)
 
@@ -286,9 +1250,9 @@ def run_iter(
 
     Each path, and the function result, will be yielded as they are completed.
 
-    Uses a process pool with "spawned" processes that share no state with the parent
-    process, to enforce consistent behavior on Linux, macOS, and Windows, where forked
-    processes are not possible.
+    Uses a process pool with "forkserver" or "spawned" processes that share no state
+    with the parent process, to enforce consistent behavior on Linux, macOS, and
+    Windows, where forked processes are not possible.
     """
     return Trailrunner().run_iter(paths, func)
 
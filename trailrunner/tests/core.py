@@ -3,15 +3,17 @@
 
 import multiprocessing
 import os
+import re
+import sys
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Generator, Iterator
+from typing import Generator, Iterator, Optional
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
-from pathspec import PathSpec
+from pathspec import PathSpec, Pattern, RegexPattern
 from pathspec.patterns.gitwildmatch import GitWildMatchPattern
 
 from trailrunner import core
@@ -31,6 +33,11 @@ def getpid(path: Path) -> int:
     return os.getpid()
 
 
+class PrefixPattern(Pattern):
+    def match_file(self, file: str) -> Optional[str]:
+        return file if file.startswith("foo") else None
+
+
 @patch.object(core.Trailrunner, "DEFAULT_EXECUTOR", ThreadPoolExecutor)
 class CoreTest(TestCase):
     maxDiff = None
@@ -79,6 +86,78 @@ class CoreTest(TestCase):
                         core.Trailrunner().run(inputs, getpid)
                         mock_exe.assert_called_with()
 
+    def test_default_context(self) -> None:
+        with self.subTest("posix"):
+            if sys.platform == "win32":
+                self.skipTest("forkserver not available on windows")
+            context = core.Trailrunner().context
+            self.assertEqual("forkserver", context.get_start_method())
+
+        with self.subTest("windows"):
+            with patch("trailrunner.core.sys.platform", "win32"):
+                context = core.Trailrunner().context
+                self.assertEqual("spawn", context.get_start_method())
+
+        with self.subTest("explicit"):
+            context = multiprocessing.get_context("spawn")
+            self.assertIs(context, core.Trailrunner(context=context).context)
+
+    def test_inline_threshold(self) -> None:
+        parent = os.getpid()
+        inputs = [Path("a.py"), Path("b.py")]
+        expected = {path: parent for path in inputs}
+
+        with patch.object(core.Trailrunner, "DEFAULT_EXECUTOR", None):
+            with self.subTest("below threshold"):
+                with patch.object(core.Trailrunner, "INLINE_THRESHOLD", 2):
+                    result = core.Trailrunner().run(inputs, getpid)
+                    self.assertDictEqual(expected, result)
+
+                    factory = Mock(wraps=ThreadPoolExecutor)
+                    tr = core.Trailrunner(executor_factory=factory)
+                    result = dict(tr.run_iter(inputs, getpid))
+                    self.assertDictEqual(expected, result)
+                    factory.assert_not_called()
+
+            with self.subTest("above threshold"):
+                with patch.object(core.Trailrunner, "INLINE_THRESHOLD", 1):
+                    result = core.Trailrunner().run(inputs, getpid)
+                    self.assertNotEqual(expected, result)  # child process
+
+                    result = dict(core.Trailrunner().run_iter(inputs, getpid))
+                    self.assertNotEqual(expected, result)  # child process
+
+    def test_persistent_executor(self) -> None:
+        factory = Mock(wraps=ThreadPoolExecutor)
+        inputs = [Path("a.py"), Path("b.py")]
+        expected = {path: os.getpid() for path in inputs}
+
+        with self.subTest("per call"):
+            tr = core.Trailrunner(executor_factory=factory)
+            self.assertDictEqual(expected, tr.run(inputs, getpid))
+            self.assertDictEqual(expected, dict(tr.run_iter(inputs, getpid)))
+            self.assertEqual(2, factory.call_count)
+
+        factory.reset_mock()
+
+        with self.subTest("context manager"):
+            with core.Trailrunner(executor_factory=factory) as tr:
+                self.assertEqual(0, factory.call_count)
+                self.assertDictEqual(expected, tr.run(inputs, getpid))
+                self.assertDictEqual(expected, dict(tr.run_iter(inputs, getpid)))
+                self.assertEqual(1, factory.call_count)
+                exe = tr._executor
+                self.assertIsNotNone(exe)
+
+            self.assertIsNone(tr._executor)
+            with self.assertRaises(RuntimeError):
+                exe.submit(getpid, Path())  # type: ignore
+
+        with self.subTest("close unused"):
+            tr = core.Trailrunner(executor_factory=factory)
+            tr.close()
+            self.assertIsNone(tr._executor)
+
     @patch("trailrunner.core.ProcessPoolExecutor")
     def test_concurrency(self, pool_mock: Mock) -> None:
         (self.td / "foo.py").write_text("\n")
@@ -123,14 +202,25 @@ class CoreTest(TestCase):
             self.assertEqual(self.td, result)
 
         with self.subTest("local root"):
-            with cd(self.td):
-                result = core.project_root(Path("frob"))
-                self.assertEqual(self.td, result)
+            result = core.project_root(Path("frob"), base=self.td)
+            self.assertEqual(self.td, result)
 
         with self.subTest("local subdir"):
-            with cd(self.td / "frob"):
-                result = core.project_root(Path("berry.py"))
-                self.assertEqual(self.td, result)
+            result = core.project_root(Path("berry.py"), base=self.td / "frob")
+            self.assertEqual(self.td, result)
+
+    def test_project_root_cached_resolve(self) -> None:
+        (self.td / ".git").mkdir()
+        (self.td / "frob").mkdir()
+
+        core.project_root(Path("frob"), base=self.td)
+        hits = core._resolve_absolute.cache_info().hits
+        self.assertEqual(self.td, core.project_root(self.td / "frob"))
+        self.assertEqual(hits + 1, core._resolve_absolute.cache_info().hits)
+
+        self.assertEqual(
+            self.td, core.project_root(Path("frob"), base=self.td / "frob")
+        )
 
     def test_project_root_multilevel(self) -> None:
         (self.td / ".hg").mkdir()
@@ -156,6 +246,29 @@ class CoreTest(TestCase):
             result = core.project_root(inner / "fuzz" / "ball.py")
             self.assertEqual(inner, result)
 
+    def test_project_root_markers(self) -> None:
+        inner = self.td / "foo" / "bar"
+        inner.mkdir(parents=True)
+        (self.td / "foo" / "setup.cfg").write_text("\n")
+        (self.td / "foo" / "build").mkdir()
+        (self.td / "foo" / "build" / "marker").write_text("\n")
+
+        with self.subTest("single name"):
+            with patch.object(core, "ROOT_MARKERS", [Path("setup.cfg")]):
+                result = core.project_root(inner)
+                self.assertEqual(self.td / "foo", result)
+
+        with self.subTest("nested path"):
+            with patch.object(core, "ROOT_MARKERS", [Path("build") / "marker"]):
+                result = core.project_root(inner)
+                self.assertEqual(self.td / "foo", result)
+
+        with self.subTest("unreadable directory"):
+            with patch.object(core, "ROOT_MARKERS", [Path("setup.cfg")]):
+                with patch("trailrunner.core.os.listdir", side_effect=OSError):
+                    result = core.project_root(inner)
+                    self.assertEqual(self.td / "foo", result)
+
     def test_gitignore(self) -> None:
         with self.subTest("no .gitignore"):
             result = core.gitignore(self.td)
@@ -177,6 +290,169 @@ class CoreTest(TestCase):
             for pattern in result.patterns:
                 self.assertIsInstance(pattern, GitWildMatchPattern)
 
+        (self.td / ".gitignore").write_bytes(
+            b"# comment\r\n\r\nfoo/\r\n\\#hash.py\r\n\xe2\x98\x83.py\r\n"
+        )
+
+        with self.subTest("comments and blank lines"):
+            result = core.gitignore(self.td)
+            self.assertEqual(3, len(result.patterns))
+            self.assertTrue(result.match_file("foo/bar.py"))
+            self.assertTrue(result.match_file("#hash.py"))
+            self.assertTrue(result.match_file("\N{SNOWMAN}.py"))
+            self.assertFalse(result.match_file("comment"))
+
+        with self.subTest("cached until modified"):
+            gi_path = self.td / ".gitignore"
+            self.assertIsNot(core.gitignore(self.td), core.gitignore(self.td))
+
+            settled = gi_path.stat().st_mtime_ns - 10_000_000_000
+            os.utime(gi_path, ns=(settled, settled))
+            result = core.gitignore(self.td)
+            self.assertIs(result, core.gitignore(self.td))
+
+            gi_path.write_text("bar/\n")
+            os.utime(gi_path, ns=(settled + 1, settled + 1))
+            result = core.gitignore(self.td)
+            self.assertListEqual(["bar/"], [p.pattern for p in result.patterns])
+
+        with self.subTest("cached by absolute path"):
+            other = self.td / "other"
+            other.mkdir()
+            (other / ".gitignore").write_text("baz/\n")
+            os.utime(other / ".gitignore", ns=(settled + 1, settled + 1))
+            with cd(self.td):
+                core.gitignore(Path("."))
+            self.assertIn(os.fspath(gi_path), core._GITIGNORE_CACHE)
+            with cd(other):
+                result = core.gitignore(Path("."))
+            self.assertListEqual(["baz/"], [p.pattern for p in result.patterns])
+
+        (self.td / ".gitignore").unlink()
+        (self.td / ".gitignore").mkdir()
+
+        with self.subTest("not a file"):
+            result = core.gitignore(self.td)
+            self.assertListEqual([], list(result.patterns))
+
+    def test_ignore_matcher(self) -> None:
+        paths = [
+            "",
+            "foo.py",
+            "foo/",
+            "foo/bar.py",
+            "bar/foo/",
+            "vendor/",
+            "vendor/lib.py",
+            "lib/keep.pyi",
+            "lib/drop.pyi",
+            "lib/",
+            "lib/sub/",
+        ]
+
+        # a gitignore-style pattern whose regex can't be folded into an alternation
+        backref = GitWildMatchPattern("foo")
+        backref.regex = re.compile(r"(o)\1")
+        ignorecase = GitWildMatchPattern("FOO")
+        ignorecase.regex = re.compile(ignorecase.regex.pattern, re.IGNORECASE)
+
+        for name, spec in [
+            ("empty", PathSpec([])),
+            ("gitignore", core.pathspec(["foo/", "vendor", "*.pyi", "/lib/*/"])),
+            ("negated", core.pathspec(["*.pyi", "!keep.pyi", "lib/", "!lib/"])),
+            ("reignored", core.pathspec(["*.py*", "!lib/*", "lib/drop.*", "!foo/"])),
+            ("regex", PathSpec([RegexPattern(r"^foo"), RegexPattern(r".+\.pyi$")])),
+            ("mixed", PathSpec([RegexPattern(r"^FOO"), RegexPattern("(?i)^lib/")])),
+            ("unanchored regex", PathSpec([RegexPattern("drop"), RegexPattern("b/")])),
+            ("unanchored alternation", PathSpec([RegexPattern("^vendor|keep")])),
+            ("unanchored glob", core.pathspec(["*/", "!lib/"])),
+            ("unanchored star", core.pathspec(["*", "!*.py"])),
+            ("whitelist", core.pathspec(["*", "!*/", "!*.py", "!*.pyi"])),
+            (
+                "inline flags",
+                PathSpec([RegexPattern("(?i)VENDOR"), RegexPattern("(?i)KEEP")]),
+            ),
+            ("backref", PathSpec([RegexPattern(r"(o)\1")])),
+            ("named backref", PathSpec([RegexPattern("(?P<x>o)(?P=x)")])),
+            ("uncombinable glob", PathSpec([backref])),
+            ("mismatched flags", PathSpec([ignorecase, GitWildMatchPattern("lib/")])),
+            ("fallback", PathSpec([PrefixPattern(True)])),
+        ]:
+            with self.subTest(name):
+                matches = core._ignore_matcher(spec)
+                expected = [path for path in paths if spec.match_file(path)]
+                result = [path for path in paths if matches(path)]
+                self.assertListEqual(expected, result)
+
+                # the last pattern matching each path decides, or None if none do
+                decide = core._ignore_decider(spec)
+                decisions = {path: decide(path) for path in paths}
+                for path in paths:
+                    last = None
+                    for pattern in spec.patterns:
+                        if pattern.match_file(path) is not None:
+                            last = pattern.include
+                    self.assertEqual(last, decisions[path], path)
+
+    def test_exclude_matcher(self) -> None:
+        paths = [
+            "",
+            "a.py",
+            "b.py",
+            "b.py/",
+            "b.py/c.py",
+            "foo/",
+            "foo/a.py",
+            "foo/bar/",
+            "foo/bar/b.py",
+            "foo/barn.py",
+            "lib/foo/",
+            "lib/foo/bar/",
+            "lib/foo/bar/x.pyi",
+            "vendor/",
+            "vendor/useful/",
+            "vendor/useful/old.py",
+            "x/vendor/",
+            "x/vendor/y.py",
+            "x/vendor",
+        ]
+
+        for name, excludes in [
+            ("none", None),
+            ("literal files", ["a.py", "b.py"]),
+            ("literal dirs", ["foo/bar/", "vendor/"]),
+            ("anchored", ["/a.py", "foo/bar", "/x/vendor/"]),
+            ("mixed", ["a.py", "*.pyi", "vendor/", "lib/**/bar/"]),
+            ("negated", ["foo/", "!foo/a.py"]),
+            ("skipped", ["/", "#a.py", "b.py ", "foo/\\bar/"]),
+        ]:
+            with self.subTest(name):
+                spec = core.pathspec(excludes)
+                matches = core._exclude_matcher(PathSpec([]), excludes)
+                expected = [path for path in paths if spec.match_file(path)]
+                result = [path for path in paths if matches(path)]
+                self.assertListEqual(expected, result)
+
+    def test_entry_checks(self) -> None:
+        (self.td / "foo").mkdir()
+        (self.td / "foo.py").write_text("\n")
+        entries = {entry.name: entry for entry in os.scandir(self.td)}
+
+        self.assertTrue(core._entry_is_dir(entries["foo"]))
+        self.assertFalse(core._entry_is_dir(entries["foo.py"]))
+        self.assertFalse(core._entry_is_file(entries["foo"]))
+        self.assertTrue(core._entry_is_file(entries["foo.py"]))
+
+        broken = Mock()
+        broken.is_dir.side_effect = PermissionError
+        broken.is_file.side_effect = PermissionError
+        broken.stat.side_effect = PermissionError
+        self.assertFalse(core._entry_is_dir(broken))
+        self.assertFalse(core._entry_is_file(broken))
+        self.assertIsNone(core._entry_stat(broken))
+        stat = core._entry_stat(entries["foo.py"])
+        self.assertEqual(1, stat.st_size if stat else None)
+
     def test_walk(self) -> None:
         (self.td / ".git").mkdir()
         inner = self.td / "inner" / "subproject"
@@ -199,6 +475,10 @@ class CoreTest(TestCase):
             expected = [inner / "requirements.txt"]
             self.assertListEqual(expected, result)
 
+        with self.subTest("explicit missing path"):
+            result = sorted(core.walk(self.td / "missing.py"))
+            self.assertListEqual([], result)
+
         with self.subTest("absolute root no gitignore"):
             result = sorted(core.walk(self.td))
             expected = [
@@ -227,34 +507,31 @@ class CoreTest(TestCase):
             self.assertListEqual(expected, result)
 
         with self.subTest("local root no gitignore"):
-            with cd(self.td):
-                result = sorted(core.walk(Path(".")))
-                expected = [
-                    Path("foo") / "a.py",
-                    Path("foo") / "bar" / "b.py",
-                    Path("foo") / "bar" / "c.pyi",
-                    Path("inner") / "subproject" / "fuzz" / "ball.py",
-                    Path("vendor") / "useful" / "old.py",
-                ]
-                self.assertListEqual(expected, result)
+            result = sorted(core.walk(Path("."), base=self.td))
+            expected = [
+                Path("foo") / "a.py",
+                Path("foo") / "bar" / "b.py",
+                Path("foo") / "bar" / "c.pyi",
+                Path("inner") / "subproject" / "fuzz" / "ball.py",
+                Path("vendor") / "useful" / "old.py",
+            ]
+            self.assertListEqual(expected, result)
 
         with self.subTest("local subdir no gitignore"):
-            with cd(self.td):
-                result = sorted(core.walk(Path("foo")))
-                expected = [
-                    Path("foo") / "a.py",
-                    Path("foo") / "bar" / "b.py",
-                    Path("foo") / "bar" / "c.pyi",
-                ]
-                self.assertListEqual(expected, result)
+            result = sorted(core.walk(Path("foo"), base=self.td))
+            expected = [
+                Path("foo") / "a.py",
+                Path("foo") / "bar" / "b.py",
+                Path("foo") / "bar" / "c.pyi",
+            ]
+            self.assertListEqual(expected, result)
 
         with self.subTest("local subdir no gitignore with excludes"):
-            with cd(self.td):
-                result = sorted(core.walk(Path("foo"), excludes=["foo/bar/"]))
-                expected = [
-                    Path("foo") / "a.py",
-                ]
-                self.assertListEqual(expected, result)
+            result = sorted(core.walk(Path("foo"), excludes=["foo/bar/"], base=self.td))
+            expected = [
+                Path("foo") / "a.py",
+            ]
+            self.assertListEqual(expected, result)
 
         (self.td / ".gitignore").write_text("vendor/\n*.pyi")
 
@@ -267,6 +544,10 @@ class CoreTest(TestCase):
             ]
             self.assertListEqual(expected, result)
 
+        with self.subTest("explicit path with gitignore"):
+            result = sorted(core.walk(self.td / "vendor" / "useful" / "old.py"))
+            self.assertListEqual([], result)
+
         with self.subTest("absolute subdir with gitignore"):
             result = sorted(core.walk(self.td / "foo"))
             expected = [
@@ -283,30 +564,96 @@ class CoreTest(TestCase):
             self.assertListEqual(expected, result)
 
         with self.subTest("local root with gitignore"):
-            with cd(self.td):
-                result = sorted(core.walk(Path(".")))
-                expected = [
-                    Path("foo") / "a.py",
-                    Path("foo") / "bar" / "b.py",
-                    Path("inner") / "subproject" / "fuzz" / "ball.py",
-                ]
-                self.assertListEqual(expected, result)
+            result = sorted(core.walk(Path("."), base=self.td))
+            expected = [
+                Path("foo") / "a.py",
+                Path("foo") / "bar" / "b.py",
+                Path("inner") / "subproject" / "fuzz" / "ball.py",
+            ]
+            self.assertListEqual(expected, result)
 
         with self.subTest("local subdir with gitignore"):
-            with cd(self.td):
-                result = sorted(core.walk(Path("foo")))
-                expected = [
-                    Path("foo") / "a.py",
-                    Path("foo") / "bar" / "b.py",
-                ]
-                self.assertListEqual(expected, result)
+            result = sorted(core.walk(Path("foo"), base=self.td))
+            expected = [
+                Path("foo") / "a.py",
+                Path("foo") / "bar" / "b.py",
+            ]
+            self.assertListEqual(expected, result)
 
         with self.subTest("inner project snubs gitignore"):
-            with cd(inner):
-                result = sorted(core.walk(Path(".")))
-                expected = [
-                    Path("fuzz") / "ball.py",
-                ]
+            result = sorted(core.walk(Path("."), base=inner))
+            expected = [
+                Path("fuzz") / "ball.py",
+            ]
+            self.assertListEqual(expected, result)
+
+    def test_walk_precomputed_ignore(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / ".gitignore").write_text("b.py\n")
+        (self.td / "a.py").write_text("\n")
+        (self.td / "b.py").write_text("\n")
+        (self.td / "c.py").write_text("\n")
+        ignore = core.pathspec(["a.py"])
+
+        with patch("trailrunner.core.gitignore") as mock:
+            with self.subTest("walk"):
+                result = sorted(core.walk(self.td, ignore=ignore))
+                expected = [self.td / "b.py", self.td / "c.py"]
+                self.assertListEqual(expected, result)
+
+            with self.subTest("walk with excludes"):
+                result = sorted(core.walk(self.td, excludes=["c.py"], ignore=ignore))
+                expected = [self.td / "b.py"]
+                self.assertListEqual(expected, result)
+
+            with self.subTest("walk_and_run"):
+                runner = core.Trailrunner(ignore=ignore)
+                result = sorted(runner.walk_and_run([self.td], str).keys())
+                expected = [self.td / "b.py", self.td / "c.py"]
+                self.assertListEqual(expected, result)
+
+            with self.subTest("unanchored regex"):
+                (self.td / "lib").mkdir()
+                (self.td / "lib" / "generated_api.py").write_text("\n")
+                regex = PathSpec([RegexPattern("generated")])
+                result = sorted(core.walk(self.td, ignore=regex))
+                expected = [self.td / "a.py", self.td / "b.py", self.td / "c.py"]
+                self.assertListEqual(expected, result)
+
+            mock.assert_not_called()
+
+    def test_walk_whitelist_gitignore(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / ".gitignore").write_text("*\n!*/\n!*.py\n")
+        (self.td / "lib" / "sub").mkdir(parents=True)
+        for name in ("a.py", "a.pyi", "lib/b.py", "lib/sub/c.py"):
+            (self.td / name).write_text("\n")
+
+        result = sorted(core.walk(self.td))
+        expected = [
+            self.td / "a.py",
+            self.td / "lib" / "b.py",
+            self.td / "lib" / "sub" / "c.py",
+        ]
+        self.assertListEqual(expected, result)
+
+    def test_walk_include_pattern(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / "foo.py").write_text("\n")
+        (self.td / "foo.pyi").write_text("\n")
+        (self.td / "foo.pyc").write_text("\n")
+        (self.td / "bar").mkdir()
+        (self.td / "bar" / "baz.txt").write_text("\n")
+
+        with self.subTest("default"):
+            result = sorted(core.walk(self.td))
+            expected = [self.td / "foo.py", self.td / "foo.pyi"]
+            self.assertListEqual(expected, result)
+
+        with self.subTest("custom"):
+            with patch.object(core, "INCLUDE_PATTERN", r".+/bar/.+\.txt$"):
+                result = sorted(core.walk(self.td))
+                expected = [self.td / "bar" / "baz.txt"]
                 self.assertListEqual(expected, result)
 
     def test_walk_with_gitignore_matching_parents(self) -> None:
@@ -347,27 +694,25 @@ class CoreTest(TestCase):
             self.assertListEqual(expected, result)
 
         with self.subTest("exclude something (relative)"):
-            with cd(root):
-                runner = core.Trailrunner()
-                result = sorted(runner.walk(Path(".")))
-                expected = sorted(
-                    [
-                        Path("foo.py"),
-                        Path("inner") / "voice.py",
-                    ]
-                )
-                self.assertListEqual(expected, result)
+            runner = core.Trailrunner()
+            result = sorted(runner.walk(Path("."), base=root))
+            expected = sorted(
+                [
+                    Path("foo.py"),
+                    Path("inner") / "voice.py",
+                ]
+            )
+            self.assertListEqual(expected, result)
 
         with self.subTest("exclude something (relative inner)"):
-            with cd(root / "inner"):
-                runner = core.Trailrunner()
-                result = sorted(runner.walk(Path(".")))
-                expected = sorted(
-                    [
-                        Path("voice.py"),
-                    ]
-                )
-                self.assertListEqual(expected, result)
+            runner = core.Trailrunner()
+            result = sorted(runner.walk(Path("."), base=root / "inner"))
+            expected = sorted(
+                [
+                    Path("voice.py"),
+                ]
+            )
+            self.assertListEqual(expected, result)
 
         (root / ".gitignore").write_text("inner/\n")
 
@@ -383,24 +728,282 @@ class CoreTest(TestCase):
             self.assertListEqual(expected, result)
 
         with self.subTest("exclude inner (relative)"):
-            with cd(root):
-                runner = core.Trailrunner()
-                result = sorted(runner.walk(Path(".")))
-                expected = sorted(
-                    [
-                        Path("foo.py"),
-                        Path("something.py"),
-                    ]
-                )
-                self.assertListEqual(expected, result)
+            runner = core.Trailrunner()
+            result = sorted(runner.walk(Path("."), base=root))
+            expected = sorted(
+                [
+                    Path("foo.py"),
+                    Path("something.py"),
+                ]
+            )
+            self.assertListEqual(expected, result)
+            self.assertIn(Path("inner"), runner.EXCLUDED)
+
+        with self.subTest("explicit file (relative)"):
+            stats = list(core.walk(Path("foo.py"), with_stat=True, base=root))
+            self.assertListEqual([Path("foo.py")], [path for path, _ in stats])
+            self.assertEqual(0, stats[0][1].st_size)
 
         with self.subTest("exclude inner (relative inner)"):
-            with cd(root / "inner"):
-                runner = core.Trailrunner()
-                result = sorted(runner.walk(Path(".")))
-                expected = sorted([])
+            runner = core.Trailrunner()
+            result = sorted(runner.walk(Path("."), base=root / "inner"))
+            expected = sorted([])
+            self.assertListEqual(expected, result)
+
+    def test_walk_prunes_ignored_dirs(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / ".gitignore").write_text("vendor/\n")
+        (self.td / "foo" / "bar").mkdir(parents=True)
+        (self.td / "foo" / "a.py").write_text("\n")
+        (self.td / "foo" / "bar" / "b.py").write_text("\n")
+        (self.td / "vendor" / "useful").mkdir(parents=True)
+        (self.td / "vendor" / "useful" / "old.py").write_text("\n")
+        (self.td / ".git" / "hooks").mkdir(parents=True)
+        (self.td / ".git" / "hooks" / "hook.py").write_text("\n")
+        (self.td / "foo" / ".hg").mkdir()
+
+        for name, excludes, expected_dirs in [
+            ("gitignore", None, [".", "foo", "foo/bar"]),
+            ("excludes", ["foo/bar/"], [".", "foo"]),
+        ]:
+            with self.subTest(name):
+                with patch("trailrunner.core.os.scandir", wraps=os.scandir) as mock:
+                    runner = core.Trailrunner()
+                    list(runner.walk(self.td, excludes=excludes))
+
+                scanned = sorted(
+                    Path(call.args[0]).relative_to(self.td).as_posix()
+                    for call in mock.call_args_list
+                )
+                self.assertListEqual(expected_dirs, scanned)
+                self.assertIn(self.td / "vendor", runner.EXCLUDED)
+                self.assertIn(self.td / ".git", runner.EXCLUDED)
+                self.assertIn(self.td / "foo" / ".hg", runner.EXCLUDED)
+
+    def test_walk_nested_gitignore(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / ".gitignore").write_text("vendor/\n")
+        (self.td / "foo" / "bar").mkdir(parents=True)
+        (self.td / "foo" / "sub").mkdir()
+        (self.td / "foo" / ".gitignore").write_text(
+            "gen_*.py\n!gen_keep.py\n/a.py\nsub/\n"
+        )
+        (self.td / "empty").mkdir()
+        (self.td / "empty" / ".gitignore").write_text("# nothing\n")
+        (self.td / "vendor").mkdir()
+        (self.td / "vendor" / ".gitignore").write_text("*.py\n")
+        for name in (
+            "gen_root.py",
+            "empty/e.py",
+            "foo/a.py",
+            "foo/gen_foo.py",
+            "foo/gen_keep.py",
+            "foo/bar/a.py",
+            "foo/bar/gen_bar.py",
+            "foo/sub/b.py",
+            "vendor/v.py",
+        ):
+            (self.td / name).write_text("\n")
+
+        with self.subTest("from root"):
+            with patch("trailrunner.core.gitignore", wraps=core.gitignore) as mock:
+                result = sorted(core.walk(self.td))
+            expected = [
+                self.td / "empty" / "e.py",
+                self.td / "foo" / "bar" / "a.py",
+                self.td / "foo" / "gen_keep.py",
+                self.td / "gen_root.py",
+            ]
+            self.assertListEqual(expected, result)
+            read = sorted(call.args[0] for call in mock.call_args_list)
+            self.assertListEqual([self.td, self.td / "empty", self.td / "foo"], read)
+
+        with self.subTest("from subdirectory"):
+            result = sorted(core.walk(Path("foo") / "bar", base=self.td))
+            self.assertListEqual([Path("foo") / "bar" / "a.py"], result)
+
+        with self.subTest("ignored subdirectory"):
+            result = sorted(core.walk(self.td / "foo" / "sub"))
+            self.assertListEqual([], result)
+
+        with self.subTest("explicit file"):
+            result = sorted(core.walk(self.td / "foo" / "gen_foo.py"))
+            self.assertListEqual([], result)
+
+        with self.subTest("precomputed ignore"):
+            result = sorted(core.walk(self.td / "foo", ignore=core.pathspec([])))
+            self.assertEqual(6, len(result))
+
+    def test_walk_nested_gitignore_priority(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / ".gitignore").write_text("*_pb2.py\n")
+        (self.td / "proto" / "inner").mkdir(parents=True)
+        (self.td / "proto" / ".gitignore").write_text("!keep_pb2.py\n")
+        (self.td / "proto" / "inner" / ".gitignore").write_text("keep_pb2.py\n")
+        for name in (
+            "a_pb2.py",
+            "proto/drop_pb2.py",
+            "proto/keep_pb2.py",
+            "proto/inner/keep_pb2.py",
+            "proto/inner/x.py",
+        ):
+            (self.td / name).write_text("\n")
+
+        for name, excludes, expected in [
+            ("deeper files win", None, ["proto/inner/x.py", "proto/keep_pb2.py"]),
+            ("literal excludes win", ["proto/keep_pb2.py"], ["proto/inner/x.py"]),
+            (
+                "negated excludes win",
+                ["!*_pb2.py"],
+                [
+                    "a_pb2.py",
+                    "proto/drop_pb2.py",
+                    "proto/inner/keep_pb2.py",
+                    "proto/inner/x.py",
+                    "proto/keep_pb2.py",
+                ],
+            ),
+        ]:
+            with self.subTest(name):
+                result = sorted(core.walk(Path("."), excludes=excludes, base=self.td))
+                self.assertListEqual([Path(path) for path in expected], result)
+
+    def test_walk_special_file(self) -> None:
+        if not hasattr(os, "mkfifo"):
+            self.skipTest("fifos not supported")
+
+        (self.td / "pyproject.toml").write_text("\n")
+        os.mkfifo(self.td / "pipe.py")
+        self.assertListEqual([], list(core.walk(self.td / "pipe.py")))
+
+    def test_walk_order(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        for name in ("zed/b.py", "zed/a.py", "b.py", "alpha/c.py", "a.py"):
+            (self.td / name).parent.mkdir(exist_ok=True)
+            (self.td / name).write_text("\n")
+
+        result = list(core.walk(self.td))
+        expected = [
+            self.td / "a.py",
+            self.td / "b.py",
+            self.td / "alpha" / "c.py",
+            self.td / "zed" / "a.py",
+            self.td / "zed" / "b.py",
+        ]
+        self.assertListEqual(expected, result)
+
+    def test_walk_symlinks(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / "foo").mkdir()
+        (self.td / "foo" / "a.py").write_text("\n")
+        try:
+            (self.td / "bar").symlink_to(self.td / "foo", target_is_directory=True)
+            (self.td / "loop").symlink_to(self.td, target_is_directory=True)
+            (self.td / "b.py").symlink_to(self.td / "foo" / "a.py")
+        except OSError:
+            self.skipTest("symlinks not supported")
+
+        with self.subTest("not followed"):
+            result = sorted(core.walk(self.td))
+            expected = [self.td / "b.py", self.td / "foo" / "a.py"]
+            self.assertListEqual(expected, result)
+
+        with self.subTest("explicit"):
+            result = sorted(core.walk(self.td / "bar"))
+            expected = [self.td / "bar" / "a.py"]
+            self.assertListEqual(expected, result)
+
+    def test_walk_with_stat(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / "foo").mkdir()
+        (self.td / "foo" / "a.py").write_text("\n" * 10)
+        (self.td / "foo" / "b.py").write_text("\n" * 20)
+
+        with self.subTest("directory"):
+            result = sorted(core.walk(self.td, with_stat=True))
+            self.assertListEqual(
+                [self.td / "foo" / "a.py", self.td / "foo" / "b.py"],
+                [path for path, _ in result],
+            )
+            self.assertListEqual([10, 20], [stat.st_size for _, stat in result])
+
+        with self.subTest("explicit file"):
+            runner = core.Trailrunner()
+            result = list(runner.walk(self.td / "foo" / "b.py", with_stat=True))
+            self.assertEqual(1, len(result))
+            path, stat = result[0]
+            self.assertEqual(self.td / "foo" / "b.py", path)
+            self.assertEqual(20, stat.st_size)
+
+        with self.subTest("stat failed"):
+            with patch("trailrunner.core._entry_stat", return_value=None):
+                result = list(core.walk(self.td, with_stat=True))
+            self.assertListEqual([], result)
+
+    def test_walk_batched(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / "a.py").write_text("\n")
+        (self.td / "b.py").write_text("\n")
+        (self.td / "empty").mkdir()
+        (self.td / "foo").mkdir()
+        (self.td / "foo" / "c.py").write_text("\n")
+
+        with self.subTest("directory"):
+            result = list(core.walk_batched(self.td))
+            expected = [
+                [self.td / "a.py", self.td / "b.py"],
+                [self.td / "foo" / "c.py"],
+            ]
+            self.assertListEqual(expected, result)
+
+        with self.subTest("file"):
+            result = list(core.walk_batched(Path("a.py"), base=self.td))
+            self.assertListEqual([[Path("a.py")]], result)
+
+        with self.subTest("with stat"):
+            batches = list(core.walk_batched(self.td / "foo", with_stat=True))
+            self.assertEqual(1, len(batches))
+            self.assertEqual(self.td / "foo" / "c.py", batches[0][0][0])
+            self.assertEqual(1, batches[0][0][1].st_size)
+
+    def test_walk_concurrency(self) -> None:
+        (self.td / "pyproject.toml").write_text("\n")
+        (self.td / ".gitignore").write_text("vendor/\n")
+        (self.td / "foo.py").write_text("\n")
+        for name in ("alpha", "beta", "gamma", "vendor"):
+            (self.td / name / "inner").mkdir(parents=True)
+            (self.td / name / "a.py").write_text("\n")
+            (self.td / name / "inner" / "b.pyi").write_text("\n")
+            (self.td / name / "inner" / "c.txt").write_text("\n")
+        (self.td / "empty").mkdir()
+
+        expected = sorted(core.Trailrunner().walk(self.td))
+        self.assertEqual(7, len(expected))
+
+        for level in (0, 2, 4):
+            with self.subTest(level):
+                runner = core.Trailrunner(walk_concurrency=level)
+                result = sorted(runner.walk(self.td))
                 self.assertListEqual(expected, result)
 
+        with self.subTest("early close"):
+            pools = []
+
+            class TrackedPool(ThreadPoolExecutor):
+                def __init__(self, max_workers: Optional[int] = None) -> None:
+                    super().__init__(max_workers)
+                    pools.append(self)
+
+            with patch("trailrunner.core.ThreadPoolExecutor", TrackedPool):
+                runner = core.Trailrunner(walk_concurrency=4)
+                gen = runner.walk(self.td)
+                self.assertIsInstance(gen, Generator)
+                first = next(gen)
+                self.assertEqual(self.td / "foo.py", first)
+                self.assertFalse(pools[0]._shutdown)
+                gen.close()
+                self.assertTrue(pools[0]._shutdown)
+
     def test_run(self) -> None:
         def get_posix(path: Path) -> str:
             return path.as_posix()
@@ -414,6 +1017,42 @@ class CoreTest(TestCase):
         result = core.run(paths, get_posix)
         self.assertDictEqual(expected, result)
 
+    def test_run_dedupe_and_order(self) -> None:
+        (self.td / "small.py").write_text("\n")
+        (self.td / "large.py").write_text("\n" * 100)
+        (self.td / "medium.py").write_text("\n" * 10)
+        paths = [
+            self.td / "small.py",
+            self.td / "missing.py",
+            self.td / "large.py",
+            self.td / "small.py",
+            self.td / "medium.py",
+        ]
+        calls = []
+
+        def record(path: Path) -> str:
+            calls.append(path)
+            return path.name
+
+        with self.subTest("dedupe"):
+            result = core.Trailrunner(executor_factory=ThreadPoolExecutor).run(
+                paths, record, chunksize=1
+            )
+            self.assertEqual(4, len(calls))
+            self.assertListEqual(
+                ["small.py", "missing.py", "large.py", "medium.py"],
+                list(result.values()),
+            )
+
+        with self.subTest("largest first"):
+            result = core.Trailrunner(executor_factory=ThreadPoolExecutor).run(
+                paths, record, largest_first=True
+            )
+            self.assertListEqual(
+                ["large.py", "medium.py", "small.py", "missing.py"],
+                list(result.values()),
+            )
+
     def test_run_iter(self) -> None:
         def get_posix(path: Path) -> str:
             return path.as_posix()
@@ -435,6 +1074,47 @@ class CoreTest(TestCase):
 
         self.assertDictEqual(expected, result)
 
+        for chunksize in (1, 2, 5):
+            with self.subTest(chunksize=chunksize):
+                gen = core.Trailrunner().run_iter(paths, get_posix, chunksize=chunksize)
+                result = dict(gen)
+                self.assertDictEqual(expected, result)
+
+        with self.subTest("bounded backlog"):
+            with patch.object(
+                ThreadPoolExecutor,
+                "submit",
+                autospec=True,
+                side_effect=ThreadPoolExecutor.submit,
+            ) as submit:
+                tr = core.Trailrunner(concurrency=1)
+                gen = tr.run_iter(paths, get_posix, chunksize=1)
+                first = next(gen)
+                self.assertIn(first, expected.items())
+                self.assertEqual(3, submit.call_count)
+                gen.close()
+                self.assertEqual(3, submit.call_count)
+
+                result = dict(tr.run_iter(paths, get_posix, chunksize=1))
+                self.assertDictEqual(expected, result)
+
+    def test_chunksize(self) -> None:
+        for concurrency, count, expected in [
+            (1, 0, 1),
+            (1, 7, 1),
+            (1, 8, 2),
+            (4, 100, 6),
+            (4, 1000, 62),
+        ]:
+            with self.subTest(concurrency=concurrency, count=count):
+                tr = core.Trailrunner(concurrency=concurrency)
+                self.assertEqual(expected, tr._chunksize(count))
+
+        with self.subTest("default concurrency"):
+            with patch("trailrunner.core.os.cpu_count", return_value=None):
+                tr = core.Trailrunner()
+                self.assertEqual(25, tr._chunksize(100))
+
     def test_walk_then_run(self) -> None:
         (self.td / "pyproject.toml").write_text("\n")
         (self.td / "foo").mkdir()
@@ -474,6 +1154,49 @@ class CoreTest(TestCase):
                 ]
                 self.assertListEqual(expected, result)
 
+        with self.subTest("overlapping paths"):
+            with cd(self.td):
+                result = sorted(
+                    core.walk_and_run([Path("foo"), Path(".")], say_hello).keys()
+                )
+                expected = [
+                    Path("foo") / "bar.py",
+                    Path("foo") / "car.py",
+                    Path("foo") / "car.pyi",
+                    Path("foo") / "foo.py",
+                    Path("vendor") / "everything.py",
+                    Path("vendor") / "something.py",
+                ]
+                self.assertListEqual(expected, result)
+
+        with self.subTest("shared root reads gitignore once"):
+            with patch("trailrunner.core.gitignore", wraps=core.gitignore) as mock:
+                paths = [self.td / "foo", self.td / "vendor"]
+                result = sorted(core.walk_and_run(paths, say_hello).keys())
+                self.assertEqual(6, len(result))
+                mock.assert_called_once_with(self.td)
+
+        with self.subTest("shared directory finds root once"):
+            with patch("trailrunner.core._find_root", wraps=core._find_root) as mock:
+                paths = [self.td / "foo" / "foo.py", self.td / "foo" / "bar.py"]
+                result = sorted(core.walk_and_run(paths, say_hello).keys())
+                self.assertListEqual(sorted(paths), result)
+                mock.assert_called_once_with(self.td / "foo")
+
+        with self.subTest("batched submissions"):
+            for chunksize, jobs in ((1, 6), (4, 2), (None, 1)):
+                with self.subTest(chunksize=chunksize):
+                    with patch(
+                        "trailrunner.core._apply_many", wraps=core._apply_many
+                    ) as mock:
+                        results = core.Trailrunner().walk_and_run(
+                            [self.td], say_hello, chunksize=chunksize
+                        )
+                        self.assertEqual(jobs, mock.call_count)
+                    foo = self.td / "foo" / "foo.py"
+                    self.assertEqual(6, len(results))
+                    self.assertEqual(f"hello {foo}", results[foo])
+
         (self.td / ".gitignore").write_text("**/foo.py\nvendor/\n")
 
         with self.subTest("local root with gitignore"):